@@ -3,16 +3,175 @@ import sys
 import os
 import logging
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../.."))
-sys.path.append(project_root)
+if project_root not in sys.path:
+    sys.path.append(project_root)
 from engine.tool_framework import run_tool, BaseTool
 
 # Other imports goes here
 import subprocess
-import re
+import string
+import functools
+import contextlib
 
-# Configure logging
-logging.basicConfig(level=logging.ERROR)
+# Configure logging; the hosting application owns the root logger
 logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Valid Debian package name characters; deleting them from a query leaves
+# only the disallowed bytes, so no regex engine is needed for validation
+_PKG_CHARS = (string.ascii_letters + string.digits + "-+.").encode("ascii")
+
+# Escapes the package name characters that are special in apt's POSIX regexes
+_ERE_ESCAPE = str.maketrans({".": "\\.", "+": "\\+"})
+
+# dpkg rewrites its status file on every install or removal, and apt update
+# renames fresh index files into its lists directory (apt's pkgcache.bin is
+# no use here: Debian's Docker images never write it). Their mtimes are part
+# of the cache key and invalidate stale lookups
+_DPKG_STATUS = "/var/lib/dpkg/status"
+_APT_LISTS = "/var/lib/apt/lists"
+
+
+def _mtime(path):
+    """Return the modification time of path in nanoseconds, or None if missing."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+# Runs external commands; tests swap in a fake instead of patching subprocess
+_runner = subprocess.run
+
+
+def _run(args):
+    """Return the raw stdout bytes of running args; callers decode only what they return."""
+    return _runner(args, capture_output=True).stdout
+
+
+# On-disk cache shared across processes and restarts; None disables it.
+# Setting DEB_TOOL_NO_CACHE to a non-empty value turns it off, e.g. for
+# read-only home directories or one-shot containers
+_CACHE_PATH = None if os.environ.get("DEB_TOOL_NO_CACHE") else os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "deb_tool", "cache.sqlite")
+
+# Seconds to wait on a locked cache before giving up and running the command
+_CACHE_TIMEOUT = 0.1
+
+
+def _open_cache(sqlite3):
+    """Open the on-disk result cache, creating it on first use; None if it cannot be opened."""
+    conn = None
+    try:
+        os.makedirs(os.path.dirname(_CACHE_PATH), exist_ok=True)
+        conn = sqlite3.connect(_CACHE_PATH, isolation_level=None, timeout=_CACHE_TIMEOUT)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS pkg ("
+                     "source TEXT, query TEXT, output BLOB, mtime INTEGER, "
+                     "PRIMARY KEY (source, query))")
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"DebTool cache unavailable: {e}")
+        if conn is not None:
+            conn.close()
+        return None
+    return conn
+
+
+def _run_cached(source, args, query, mtime):
+    """
+    Return the stdout bytes of args, reusing a persisted result when it is fresh.
+
+    A result is fresh when it was stored under the same mtime of the
+    package database it was read from. Without an mtime there is nothing
+    to validate against, so the disk cache is bypassed.
+    """
+    if _CACHE_PATH is None or mtime is None:
+        return _run(args)
+
+    # Imported here so loading the tool does not pay for sqlite3 until the
+    # disk cache is actually used
+    import sqlite3
+    conn = _open_cache(sqlite3)
+    if conn is None:
+        return _run(args)
+
+    # The cache is best-effort: a locked, read-only or mismatched database
+    # must never cost more than running the command itself
+    output = None
+    try:
+        with contextlib.closing(conn):
+            row = conn.execute("SELECT output FROM pkg WHERE source=? AND query=? AND mtime=?",
+                               (source, query, mtime)).fetchone()
+            if row is not None:
+                return row[0]
+
+            output = _run(args)
+            # Rows from an older package database can never be hit again
+            conn.execute("DELETE FROM pkg WHERE source=? AND mtime!=?", (source, mtime))
+            conn.execute("INSERT OR REPLACE INTO pkg VALUES (?, ?, ?, ?)",
+                         (source, query, output, mtime))
+    except sqlite3.Error as e:
+        logger.warning(f"DebTool cache unavailable: {e}")
+    return output if output is not None else _run(args)
+
+
+@functools.lru_cache(maxsize=512)
+def _run_dpkg(queries, dpkg_mtime):
+    """Return the stdout bytes of ``dpkg -l`` for a tuple of queries (cached per dpkg_mtime)."""
+    return _run_cached("dpkg", ['dpkg', '-l', *queries], " ".join(queries), dpkg_mtime)
+
+
+@functools.lru_cache(maxsize=512)
+def _run_apt(search_args, apt_mtime):
+    """Return the stdout bytes of ``apt-cache search`` for a tuple of arguments (cached per apt_mtime)."""
+    return _run_cached("apt", ['apt-cache', 'search', *search_args], " ".join(search_args), apt_mtime)
+
+
+def _validate(query):
+    """Return an error message if query is not a valid package name, else None."""
+    # Check if the query is empty
+    if not query:
+        return "Error: Please provide a package name or pattern to search for."
+
+    # Sanitize the input to prevent command injection
+    if query.encode("ascii", "replace").translate(None, _PKG_CHARS):
+        return "Error: Invalid package name. Package names can only contain alphanumeric characters, hyphens, plus signs, and periods."
+
+    # Debian package names start with a letter or digit; anything else would
+    # be parsed by dpkg/apt-cache as an option
+    if not query[0].isalnum():
+        return "Error: Invalid package name. Package names must start with a letter or digit."
+    return None
+
+
+def _names_pattern(names):
+    """
+    Build an anchored apt regex matching exactly names.
+
+    The common prefix is factored out of the alternation, e.g.
+    ``^python3(-dev|-venv)?$`` rather than ``^(python3|python3-dev|python3-venv)$``,
+    so the regex engine does not re-scan the shared prefix once per name.
+    """
+    if len(names) == 1:
+        return "^" + names[0].translate(_ERE_ESCAPE) + "$"
+    prefix = os.path.commonprefix(names)
+    suffixes = [name[len(prefix):].translate(_ERE_ESCAPE) for name in names]
+    optional = "?" if "" in suffixes else ""
+    return f"^{prefix.translate(_ERE_ESCAPE)}({'|'.join(suffix for suffix in suffixes if suffix)}){optional}$"
+
+
+def _listed_names(output):
+    """Return the lower-cased package names listed in ``dpkg -l`` output."""
+    names = set()
+    for line in output.splitlines():
+        # Package rows start with a lower-case status such as "ii" or "rc";
+        # the header lines start with upper case or punctuation
+        if line[:1].islower():
+            names.add(line.split()[1].split(":", 1)[0].lower())
+    return names
+
 
 # Tool implementation
 @run_tool
@@ -29,31 +188,76 @@ class DebTool(BaseTool):
 
     def deb(self, query: str):
         try:
-            # Check if the query is empty
-            if not query:
-                return "Error: Please provide a package name or pattern to search for."
-            
-            # Sanitize the input to prevent command injection
-            if not re.match(r'^[a-zA-Z0-9\-\+\.]+$', query):
-                return "Error: Invalid package name. Package names can only contain alphanumeric characters, hyphens, plus signs, and periods."
+            error = _validate(query)
+            if error:
+                return error
             
             # Run dpkg command to get package information
-            result = subprocess.run(['dpkg', '-l', query], 
-                                   capture_output=True, 
-                                   text=True)
+            output = _run_dpkg((query,), _mtime(_DPKG_STATUS))
             
             # Check if the package was found
-            if "No packages found matching" in result.stdout or not result.stdout.strip():
+            if b"No packages found matching" in output or not output.strip():
                 # Try apt-cache search as a fallback
-                result = subprocess.run(['apt-cache', 'search', query], 
-                                       capture_output=True, 
-                                       text=True)
-                if result.stdout.strip():
-                    return f"Package '{query}' not installed, but found in repositories:\n{result.stdout}"
+                output = _run_apt((query,), _mtime(_APT_LISTS))
+                if output.strip():
+                    return f"Package '{query}' not installed, but found in repositories:\n{output.decode('utf-8', 'replace')}"
                 else:
                     return f"No information found for package '{query}'."
             
-            return result.stdout
+            return output.decode("utf-8", "replace")
+        except Exception as e:
+            logger.error(f"Error in DebTool: {e}", exc_info=True)
+            return f"Error: {e}"
+
+    def deb_batch(self, queries: list):
+        """
+        Query several packages with one dpkg call and at most one apt-cache call.
+
+        Args:
+            queries (list): The package names to search for.
+
+        Returns:
+            The dpkg listing of the installed packages, followed for each package
+            that is not installed by either its apt-cache line under a "found in
+            repositories" header or a "No information found" line, or an error
+            message.
+        """
+        try:
+            # A bare string would otherwise be iterated character by character
+            if not isinstance(queries, (list, tuple)) or not all(isinstance(query, str) for query in queries):
+                return "Error: Please provide the package names as a list of strings."
+            
+            if not queries:
+                return "Error: Please provide at least one package name to search for."
+            
+            queries = list(dict.fromkeys(queries))
+            for query in queries:
+                error = _validate(query)
+                if error:
+                    return error
+            
+            # A single dpkg call lists every installed package among the queries
+            output = _run_dpkg(tuple(queries), _mtime(_DPKG_STATUS)).decode("utf-8", "replace")
+            listed = _listed_names(output)
+            parts = [output.rstrip("\n")] if listed else []
+            
+            missing = [query for query in queries if query.lower() not in listed]
+            if missing:
+                # One anchored, names-only search covers all remaining packages
+                pattern = _names_pattern(missing)
+                found = {}
+                search = _run_apt(("--names-only", pattern), _mtime(_APT_LISTS)).decode("utf-8", "replace")
+                for line in search.splitlines():
+                    found[line.split(" - ", 1)[0].lower()] = line
+                
+                for query in missing:
+                    line = found.get(query.lower())
+                    if line:
+                        parts.append(f"Package '{query}' not installed, but found in repositories:\n{line}")
+                    else:
+                        parts.append(f"No information found for package '{query}'.")
+            
+            return "\n".join(parts)
         except Exception as e:
             logger.error(f"Error in DebTool: {e}", exc_info=True)
-            return f"Error: {e}"
\ No newline at end of file
+            return f"Error: {e}"
@@ -1,94 +1,328 @@
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
+import subprocess
 import sys
 import os
+import tempfile
+import time
+import sqlite3
 
 # Add the project root to the path to import the module
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../.."))
-sys.path.append(project_root)
+if project_root not in sys.path:
+    sys.path.append(project_root)
 
 # Import the module to be tested
 from engine.tools.deb_tool import DebTool
+from engine.tools.deb_tool import main as deb_main
+
+class FakeRun:
+    """Stand-in for subprocess.run that answers each command with canned stdout (str or raw bytes)"""
+    def __init__(self, responses=None, error=None):
+        self.responses = responses or {}
+        self.error = error
+        self.calls = []
+
+    def __call__(self, args, **kwargs):
+        self.calls.append(list(args))
+        if self.error:
+            raise self.error
+        stdout = self.responses.get(tuple(args), "")
+        if isinstance(stdout, str):
+            stdout = stdout.encode()
+        return subprocess.CompletedProcess(args, 0, stdout=stdout, stderr=b"")
 
 class TestDebTool(unittest.TestCase):
+    # Shared read-only fixtures
+    PYTHON3_ROW = "ii  python3    3.9.5    amd64    Python interpreter"
+    INVALID_NAME_ERROR = "Error: Invalid package name. Package names can only contain alphanumeric characters, hyphens, plus signs, and periods."
+
+    @classmethod
+    def setUpClass(cls):
+        # DebTool keeps no per-instance state, so one instance serves every test
+        cls.deb_tool = DebTool()
+
+        # Keep tests off the user's on-disk cache
+        cache_patcher = patch.object(deb_main, '_CACHE_PATH', None)
+        cache_patcher.start()
+        cls.addClassCleanup(cache_patcher.stop)
+
     def setUp(self):
-        self.deb_tool = DebTool()
-    
+        deb_main._run_dpkg.cache_clear()
+        deb_main._run_apt.cache_clear()
+
+    def use_runner(self, runner):
+        """Route the tool's commands to runner for the rest of the test"""
+        original = deb_main._runner
+        deb_main._runner = runner
+        self.addCleanup(setattr, deb_main, '_runner', original)
+        return runner
+
     def test_deb_empty_query(self):
         """Test that an empty query returns an error message"""
         result = self.deb_tool.deb("")
         self.assertEqual(result, "Error: Please provide a package name or pattern to search for.")
-    
+
     def test_deb_invalid_query(self):
         """Test that an invalid query with special characters returns an error message"""
         result = self.deb_tool.deb("invalid;rm -rf /")
-        self.assertEqual(result, "Error: Invalid package name. Package names can only contain alphanumeric characters, hyphens, plus signs, and periods.")
-    
-    @patch('subprocess.run')
-    def test_deb_package_found(self, mock_run):
+        self.assertEqual(result, self.INVALID_NAME_ERROR)
+
+    def test_deb_trailing_newline_query(self):
+        """Test that a trailing newline is not accepted as part of a package name"""
+        result = self.deb_tool.deb("python3\n")
+        self.assertEqual(result, self.INVALID_NAME_ERROR)
+
+    def test_deb_non_ascii_query(self):
+        """Test that non-ASCII characters are rejected"""
+        result = self.deb_tool.deb("pythön3")
+        self.assertEqual(result, self.INVALID_NAME_ERROR)
+
+    def test_deb_package_found(self):
         """Test that a valid package query returns package information"""
-        # Mock the subprocess.run to return a successful result
-        mock_process = MagicMock()
-        mock_process.stdout = "ii  python3    3.9.5    amd64    Python interpreter"
-        mock_process.stderr = ""
-        mock_run.return_value = mock_process
-        
+        run = self.use_runner(FakeRun({
+            ('dpkg', '-l', 'python3'): self.PYTHON3_ROW,
+        }))
+
         result = self.deb_tool.deb("python3")
-        self.assertEqual(result, "ii  python3    3.9.5    amd64    Python interpreter")
-        mock_run.assert_called_once_with(['dpkg', '-l', 'python3'], capture_output=True, text=True)
-    
-    @patch('subprocess.run')
-    def test_deb_package_not_installed_but_found(self, mock_run):
+        self.assertEqual(result, self.PYTHON3_ROW)
+        self.assertEqual(run.calls, [['dpkg', '-l', 'python3']])
+
+    def test_deb_package_not_installed_but_found(self):
         """Test that a package not installed but found in repositories returns appropriate message"""
-        # First call to dpkg returns no packages found
-        mock_process_dpkg = MagicMock()
-        mock_process_dpkg.stdout = "No packages found matching python3-dev"
-        mock_process_dpkg.stderr = ""
-        
-        # Second call to apt-cache returns package info
-        mock_process_apt = MagicMock()
-        mock_process_apt.stdout = "python3-dev - Header files and a static library for Python"
-        mock_process_apt.stderr = ""
-        
-        mock_run.side_effect = [mock_process_dpkg, mock_process_apt]
-        
+        run = self.use_runner(FakeRun({
+            ('dpkg', '-l', 'python3-dev'): "No packages found matching python3-dev",
+            ('apt-cache', 'search', 'python3-dev'): "python3-dev - Header files and a static library for Python",
+        }))
+
         result = self.deb_tool.deb("python3-dev")
         self.assertEqual(result, "Package 'python3-dev' not installed, but found in repositories:\npython3-dev - Header files and a static library for Python")
-        
+
         # Check that both commands were called
-        self.assertEqual(mock_run.call_count, 2)
-        mock_run.assert_any_call(['dpkg', '-l', 'python3-dev'], capture_output=True, text=True)
-        mock_run.assert_any_call(['apt-cache', 'search', 'python3-dev'], capture_output=True, text=True)
-    
-    @patch('subprocess.run')
-    def test_deb_package_not_found(self, mock_run):
+        self.assertEqual(run.calls, [['dpkg', '-l', 'python3-dev'], ['apt-cache', 'search', 'python3-dev']])
+
+    def test_deb_package_not_found(self):
         """Test that a package not found anywhere returns appropriate message"""
-        # First call to dpkg returns no packages found
-        mock_process_dpkg = MagicMock()
-        mock_process_dpkg.stdout = "No packages found matching nonexistentpackage"
-        mock_process_dpkg.stderr = ""
-        
-        # Second call to apt-cache returns empty
-        mock_process_apt = MagicMock()
-        mock_process_apt.stdout = ""
-        mock_process_apt.stderr = ""
-        
-        mock_run.side_effect = [mock_process_dpkg, mock_process_apt]
-        
+        run = self.use_runner(FakeRun({
+            ('dpkg', '-l', 'nonexistentpackage'): "No packages found matching nonexistentpackage",
+        }))
+
         result = self.deb_tool.deb("nonexistentpackage")
         self.assertEqual(result, "No information found for package 'nonexistentpackage'.")
-        
+
         # Check that both commands were called
-        self.assertEqual(mock_run.call_count, 2)
-    
-    @patch('subprocess.run')
-    def test_deb_exception_handling(self, mock_run):
+        self.assertEqual(len(run.calls), 2)
+
+    def test_deb_invalid_utf8_output(self):
+        """Test that undecodable command output is returned with replacement characters"""
+        self.use_runner(FakeRun({
+            ('dpkg', '-l', 'python3'): b"ii  python3    3.9.5    amd64    Python \xff interpreter\n",
+            ('apt-cache', 'search', 'python3-dev'): b"python3-dev - Header files \xfe\xff",
+        }))
+
+        self.assertEqual(self.deb_tool.deb("python3"), "ii  python3    3.9.5    amd64    Python \ufffd interpreter\n")
+        self.assertEqual(self.deb_tool.deb_batch(["python3"]), "ii  python3    3.9.5    amd64    Python \ufffd interpreter")
+        self.assertEqual(self.deb_tool.deb("python3-dev"),
+                         "Package 'python3-dev' not installed, but found in repositories:\npython3-dev - Header files \ufffd\ufffd")
+
+    def test_deb_repeated_query_is_cached(self):
+        """Test that repeating a query does not run dpkg again"""
+        run = self.use_runner(FakeRun({
+            ('dpkg', '-l', 'python3'): self.PYTHON3_ROW,
+        }))
+
+        first = self.deb_tool.deb("python3")
+        second = self.deb_tool.deb("python3")
+        self.assertEqual(first, second)
+        self.assertEqual(run.calls, [['dpkg', '-l', 'python3']])
+
+    def test_deb_cache_invalidated_by_database_change(self):
+        """Test that a changed package database mtime runs dpkg again"""
+        run = self.use_runner(FakeRun({
+            ('dpkg', '-l', 'python3'): self.PYTHON3_ROW,
+        }))
+
+        with patch.object(deb_main, '_mtime', new=lambda path: 1):
+            self.deb_tool.deb("python3")
+        with patch.object(deb_main, '_mtime', new=lambda path: 2):
+            self.deb_tool.deb("python3")
+        self.assertEqual(run.calls, [['dpkg', '-l', 'python3'], ['dpkg', '-l', 'python3']])
+
+    def test_deb_apt_cache_invalidated_by_update(self):
+        """Test that apt results expire when apt update refreshes its lists, even without pkgcache.bin"""
+        run = self.use_runner(FakeRun())
+        lists_mtime = [1]
+
+        # Docker images ship without /var/cache/apt/pkgcache.bin
+        def fake_mtime(path):
+            if path == "/var/cache/apt/pkgcache.bin":
+                return None
+            return lists_mtime[0] if path == deb_main._APT_LISTS else 1
+
+        with patch.object(deb_main, '_mtime', new=fake_mtime):
+            self.deb_tool.deb("python3-dev")
+            lists_mtime[0] = 2
+            self.deb_tool.deb("python3-dev")
+
+        self.assertEqual(run.calls, [['dpkg', '-l', 'python3-dev'], ['apt-cache', 'search', 'python3-dev'],
+                                     ['apt-cache', 'search', 'python3-dev']])
+
+    @patch.object(deb_main, '_mtime', new=lambda path: 1)
+    def test_deb_result_persisted_on_disk(self):
+        """Test that results survive an in-memory cache reset via the on-disk cache"""
+        run = self.use_runner(FakeRun({
+            ('dpkg', '-l', 'python3'): self.PYTHON3_ROW,
+        }))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with patch.object(deb_main, '_CACHE_PATH', os.path.join(tmp, "cache.sqlite")):
+                first = self.deb_tool.deb("python3")
+                deb_main._run_dpkg.cache_clear()
+                second = self.deb_tool.deb("python3")
+
+        self.assertEqual(first, second)
+        self.assertEqual(run.calls, [['dpkg', '-l', 'python3']])
+
+    def test_deb_disk_cache_miss_on_database_change(self):
+        """Test that a persisted result stored under another mtime is not reused"""
+        run = self.use_runner(FakeRun({
+            ('dpkg', '-l', 'python3'): self.PYTHON3_ROW,
+        }))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with patch.object(deb_main, '_CACHE_PATH', os.path.join(tmp, "cache.sqlite")):
+                with patch.object(deb_main, '_mtime', new=lambda path: 1):
+                    self.deb_tool.deb("python3")
+                deb_main._run_dpkg.cache_clear()
+                with patch.object(deb_main, '_mtime', new=lambda path: 2):
+                    self.deb_tool.deb("python3")
+
+        self.assertEqual(run.calls, [['dpkg', '-l', 'python3'], ['dpkg', '-l', 'python3']])
+
+    def test_deb_disk_cache_prunes_stale_rows(self):
+        """Test that writing a result drops rows stored under an older database mtime"""
+        self.use_runner(FakeRun())
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite")
+            with patch.object(deb_main, '_CACHE_PATH', path):
+                with patch.object(deb_main, '_mtime', new=lambda path: 1):
+                    self.deb_tool.deb("python3")
+                    self.deb_tool.deb("bash")
+                with patch.object(deb_main, '_mtime', new=lambda path: 2):
+                    self.deb_tool.deb("python3")
+
+            conn = sqlite3.connect(path)
+            rows = conn.execute("SELECT source, query, mtime FROM pkg WHERE source='dpkg'").fetchall()
+            conn.close()
+
+        self.assertEqual(rows, [("dpkg", "python3", 2)])
+
+    @patch.object(deb_main, '_mtime', new=lambda path: 1)
+    def test_deb_locked_disk_cache_falls_back(self):
+        """Test that a locked on-disk cache is skipped quickly instead of failing the query"""
+        run = self.use_runner(FakeRun({
+            ('dpkg', '-l', 'python3'): self.PYTHON3_ROW,
+        }))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite")
+            locker = sqlite3.connect(path, isolation_level=None)
+            locker.execute("BEGIN EXCLUSIVE")
+            try:
+                with patch.object(deb_main, '_CACHE_PATH', path), \
+                        self.assertLogs(deb_main.logger, 'WARNING'):
+                    start = time.monotonic()
+                    result = self.deb_tool.deb("python3")
+                    elapsed = time.monotonic() - start
+            finally:
+                locker.close()
+
+        self.assertEqual(result, self.PYTHON3_ROW)
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(run.calls, [['dpkg', '-l', 'python3']])
+
+    @patch.object(deb_main, '_mtime', new=lambda path: 1)
+    def test_deb_broken_disk_cache_runs_command_once(self):
+        """Test that a cache write failure still returns the output without rerunning dpkg"""
+        run = self.use_runner(FakeRun({
+            ('dpkg', '-l', 'python3'): self.PYTHON3_ROW,
+        }))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite")
+            # A pkg table from some other schema: reads work, writes fail
+            conn = sqlite3.connect(path)
+            conn.execute("CREATE TABLE pkg (source TEXT, query TEXT, output BLOB, mtime INTEGER, extra TEXT)")
+            conn.commit()
+            conn.close()
+
+            with patch.object(deb_main, '_CACHE_PATH', path), \
+                    self.assertLogs(deb_main.logger, 'WARNING'):
+                result = self.deb_tool.deb("python3")
+
+        self.assertEqual(result, self.PYTHON3_ROW)
+        self.assertEqual(run.calls, [['dpkg', '-l', 'python3']])
+
+    def test_deb_batch_single_invocation(self):
+        """Test that a batch query runs dpkg and apt-cache once for all packages"""
+        pattern = '^(g\\+\\+-12|nonexistentpackage)$'
+        run = self.use_runner(FakeRun({
+            ('dpkg', '-l', 'python3', 'g++-12', 'nonexistentpackage'): self.PYTHON3_ROW + "\n",
+            ('apt-cache', 'search', '--names-only', pattern): "g++-12 - GNU C++ compiler\n",
+        }))
+
+        result = self.deb_tool.deb_batch(["python3", "g++-12", "nonexistentpackage"])
+        self.assertEqual(result, self.PYTHON3_ROW + "\n"
+                                 "Package 'g++-12' not installed, but found in repositories:\ng++-12 - GNU C++ compiler\n"
+                                 "No information found for package 'nonexistentpackage'.")
+
+        self.assertEqual(run.calls, [['dpkg', '-l', 'python3', 'g++-12', 'nonexistentpackage'],
+                                     ['apt-cache', 'search', '--names-only', pattern]])
+
+    def test_deb_batch_pattern_factors_common_prefix(self):
+        """Test that the apt-cache fallback pattern shares the common prefix of the names"""
+        run = self.use_runner(FakeRun())
+
+        self.deb_tool.deb_batch(["python3", "python3-dev", "python3-venv"])
+        self.assertEqual(run.calls[-1], ['apt-cache', 'search', '--names-only', '^python3(-dev|-venv)?$'])
+
+    def test_deb_option_like_query(self):
+        """Test that a name starting with a hyphen cannot be passed to dpkg as an option"""
+        run = self.use_runner(FakeRun())
+
+        result = self.deb_tool.deb("-l")
+        self.assertEqual(result, "Error: Invalid package name. Package names must start with a letter or digit.")
+        self.assertEqual(run.calls, [])
+
+    def test_deb_batch_option_like_query(self):
+        """Test that a batch cannot smuggle a dpkg option and its value"""
+        run = self.use_runner(FakeRun())
+
+        result = self.deb_tool.deb_batch(["--admindir", "x", "bash"])
+        self.assertEqual(result, "Error: Invalid package name. Package names must start with a letter or digit.")
+        self.assertEqual(run.calls, [])
+
+    def test_deb_batch_requires_list_of_strings(self):
+        """Test that a bare string or non-string names are rejected instead of split into characters"""
+        run = self.use_runner(FakeRun())
+
+        for queries in ("python3", ["python3", 3]):
+            result = self.deb_tool.deb_batch(queries)
+            self.assertEqual(result, "Error: Please provide the package names as a list of strings.")
+        self.assertEqual(run.calls, [])
+
+    def test_deb_batch_invalid_query(self):
+        """Test that one invalid name rejects the whole batch"""
+        result = self.deb_tool.deb_batch(["python3", "invalid;rm -rf /"])
+        self.assertEqual(result, self.INVALID_NAME_ERROR)
+
+    def test_deb_exception_handling(self):
         """Test that exceptions are properly caught and reported"""
-        # Mock subprocess.run to raise an exception
-        mock_run.side_effect = Exception("Command failed")
-        
+        self.use_runner(FakeRun(error=Exception("Command failed")))
+
         result = self.deb_tool.deb("python3")
         self.assertEqual(result, "Error: Command failed")
 
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()